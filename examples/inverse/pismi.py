@@ -18,25 +18,30 @@
 # along with PISM; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
-# try to start coverage
-try:                            # pragma: no cover
-    import coverage
-    cov = coverage.coverage(branch=True)
-    try:
-        # try to load coverage data and ignore failures
-        cov.load()
-    except:
+import sys
+
+# try to start coverage (only if a report was requested: tracing slows
+# everything down and the data is not saved otherwise)
+if "-report_coverage" in sys.argv:
+    try:                            # pragma: no cover
+        import coverage
+        cov = coverage.coverage(branch=True)
+        try:
+            # try to load coverage data and ignore failures
+            cov.load()
+        except:
+            pass
+        cov.start()
+    except ImportError:             # pragma: no cover
         pass
-    cov.start()
-except ImportError:             # pragma: no cover
-    pass
 
 import PISM
 import PISM.invert.ssa
 from PISM.logging import logMessage
 from PISM.util import convert
 import numpy as np
-import sys, os, math
+import os, math
+import importlib
 
 
 class SSAForwardRun(PISM.invert.ssa.SSAForwardRunFromInputFile):
@@ -48,19 +53,30 @@ class SSAForwardRun(PISM.invert.ssa.SSAForwardRunFromInputFile):
             grid = self.grid
             vecs = self.modeldata.vecs
 
-            pio = PISM.PIO(grid.com, "netcdf3", filename, PISM.PISM_READWRITE)  # append mode!
+            pio = PISM.PIO(grid.com, self.config.get_string("output.format"),
+                           filename, PISM.PISM_READWRITE)  # append mode!
 
-            self.modeldata.vecs.write(filename)
+            self.modeldata.vecs.write(pio)
             pio.close()
 
 
+def weighted_residual(weight, r, Vmax, out):
+    """Computes `weight` * `r` clipped to [-`Vmax`, `Vmax`], storing the result in `out`.
+    Used to plot residual components; `weight` may be an array or a number."""
+    np.multiply(weight, r, out=out)
+    return np.clip(out, -Vmax, Vmax, out=out)
+
+
 class InvSSAPlotListener(PISM.invert.listener.PlotListener):
 
     def __init__(self, grid, Vmax):
         PISM.invert.listener.PlotListener.__init__(self, grid)
         self.Vmax = Vmax
+        self.secpera = convert(1.0, "year", "second")
         self.l2_weight = None
+        self.l2_weight_scaled = None
         self.l2_weight_init = False
+        self.buffer = None
 
     def __call__(self, inverse_solver, count, data):
 
@@ -68,6 +84,11 @@ class InvSSAPlotListener(PISM.invert.listener.PlotListener):
             vecs = inverse_solver.ssarun.modeldata.vecs
             if vecs.has('vel_misfit_weight'):
                 self.l2_weight = self.toproczero(vecs.vel_misfit_weight)
+            # residuals are plotted in m/year, weighted if possible
+            if self.l2_weight is not None:
+                self.l2_weight_scaled = self.l2_weight * self.secpera
+            else:
+                self.l2_weight_scaled = self.secpera
             self.l2_weight_init = True
 
         method = inverse_solver.method
@@ -84,68 +105,42 @@ class InvSSAPlotListener(PISM.invert.listener.PlotListener):
             d = self.toproczero(data.zeta_step)
         zeta = self.toproczero(data.zeta)
 
-        secpera = convert(1.0, "year", "second")
-
         if self.grid.rank() == 0:
             import matplotlib.pyplot as pp
 
             pp.figure(self.figure())
 
-            l2_weight = self.l2_weight
-
-            pp.clf()
+            weight = self.l2_weight_scaled
 
             V = self.Vmax
+            secpera = self.secpera
 
-            pp.subplot(2, 3, 1)
-            if l2_weight is not None:
-                rx = l2_weight * r[0, :, :] * secpera
-            else:
-                rx = r[0, :, :] * secpera
-            rx = np.maximum(rx, -V)
-            rx = np.minimum(rx, V)
-            pp.imshow(rx, origin='lower', interpolation='nearest')
-            pp.colorbar()
-            pp.title('r_x')
-            pp.jet()
-
-            pp.subplot(2, 3, 4)
-            if l2_weight is not None:
-                ry = l2_weight * r[1, :, :] * secpera
-            else:
-                ry = r[1, :, :] * secpera
-            ry = np.maximum(ry, -V)
-            ry = np.minimum(ry, V)
-            pp.imshow(ry, origin='lower', interpolation='nearest')
-            pp.colorbar()
-            pp.title('r_y')
-            pp.jet()
+            # numpy() stores components of vector fields along the last axis;
+            # make each component contiguous
+            r = np.ascontiguousarray(np.moveaxis(r, -1, 0))
+            if Td is not None:
+                Td = np.ascontiguousarray(np.moveaxis(Td, -1, 0))
+
+            if self.buffer is None:
+                self.buffer = np.empty_like(r[0, :, :])
+            # imshow() copies its input, so one scratch buffer is enough
+            buf = self.buffer
+
+            self.imshow(weighted_residual(weight, r[0, :, :], V, buf), (2, 3, 1), 'r_x')
+
+            self.imshow(weighted_residual(weight, r[1, :, :], V, buf), (2, 3, 4), 'r_y')
 
             if method == 'ign':
-                pp.subplot(2, 3, 2)
-                Tdx = Td[0, :, :] * secpera
-                pp.imshow(Tdx, origin='lower', interpolation='nearest')
-                pp.colorbar()
-                pp.title('Td_x')
-                pp.jet()
-
-                pp.subplot(2, 3, 5)
-                Tdy = Td[1, :, :] * secpera
-                pp.imshow(Tdy, origin='lower', interpolation='nearest')
-                pp.colorbar()
-                pp.title('Td_y')
-                pp.jet()
+                Tdx = np.multiply(Td[0, :, :], secpera, out=buf)
+                self.imshow(Tdx, (2, 3, 2), 'Td_x')
+
+                Tdy = np.multiply(Td[1, :, :], secpera, out=buf)
+                self.imshow(Tdy, (2, 3, 5), 'Td_y')
             elif method == 'sd' or method == 'nlcg':
-                pp.subplot(2, 3, 2)
-                pp.imshow(TStarR, origin='lower', interpolation='nearest')
-                pp.colorbar()
-                pp.title('TStarR')
-                pp.jet()
+                self.imshow(TStarR, (2, 3, 2), 'TStarR')
 
             if d is not None:
-                d *= -1
-                pp.subplot(2, 3, 3)
-                pp.imshow(d, origin='lower', interpolation='nearest')
+                np.negative(d, out=d)
 
                 # colorbar does a divide by zero if 'd' is all zero,
                 # as it will be at the start of iteration zero.
@@ -153,16 +148,9 @@ class InvSSAPlotListener(PISM.invert.listener.PlotListener):
                 import warnings
                 with warnings.catch_warnings():
                     warnings.simplefilter("ignore")
-                    pp.colorbar()
-                    pp.jet()
-
-                pp.title('-zeta_step')
+                    self.imshow(d, (2, 3, 3), '-zeta_step')
 
-            pp.subplot(2, 3, 6)
-            pp.imshow(zeta, origin='lower', interpolation='nearest')
-            pp.colorbar()
-            pp.jet()
-            pp.title('zeta')
+            self.imshow(zeta, (2, 3, 6), 'zeta')
 
             pp.ion()
             pp.draw()
@@ -176,14 +164,18 @@ class InvSSALinPlotListener(PISM.invert.listener.PlotListener):
         self.Vmax = Vmax
         self.l2_weight = None
         self.l2_weight_init = False
+        self.buffer = None
 
     def __call__(self, inverse_solver, count, data):
         # On the first go-around, extract the l2_weight vector onto
         # processor zero.
-        if self.l2_weight_init == False:
+        if not self.l2_weight_init:
             vecs = inverse_solver.ssarun.modeldata.vecs
-            self.l2_weight = self.toproczero(vecs.vel_misfit_weight)
-            self.l2_init = True
+            if vecs.has('vel_misfit_weight'):
+                self.l2_weight = self.toproczero(vecs.vel_misfit_weight)
+            else:
+                self.l2_weight = 1.0
+            self.l2_weight_init = True
 
         l2_weight = self.l2_weight
         r = self.toproczero(data.r)
@@ -192,52 +184,41 @@ class InvSSALinPlotListener(PISM.invert.listener.PlotListener):
         if self.grid.rank() == 0:
             import matplotlib.pyplot as pp
             pp.figure(self.figure())
-            pp.clf()
 
             V = self.Vmax
-            pp.subplot(1, 3, 1)
-            rx = l2_weight * r[0, :, :]
-            rx = np.maximum(rx, -V)
-            rx = np.minimum(rx, V)
-            pp.imshow(rx, origin='lower', interpolation='nearest')
-            pp.colorbar()
-            pp.title('ru')
-            pp.jet()
-
-            pp.subplot(1, 3, 2)
-            ry = l2_weight * r[1, :, :]
-            ry = np.maximum(ry, -V)
-            ry = np.minimum(ry, V)
-            pp.imshow(ry, origin='lower', interpolation='nearest')
-            pp.colorbar()
-            pp.title('rv')
-            pp.jet()
-
-            d *= -1
-            pp.subplot(1, 3, 3)
-            pp.imshow(d, origin='lower', interpolation='nearest')
-            pp.colorbar()
-            pp.jet()
-            pp.title('-d')
+
+            r = np.ascontiguousarray(np.moveaxis(r, -1, 0))
+
+            if self.buffer is None:
+                self.buffer = np.empty_like(r[0, :, :])
+            buf = self.buffer
+
+            self.imshow(weighted_residual(l2_weight, r[0, :, :], V, buf), (1, 3, 1), 'ru')
+
+            self.imshow(weighted_residual(l2_weight, r[1, :, :], V, buf), (1, 3, 2), 'rv')
+
+            np.negative(d, out=d)
+            self.imshow(d, (1, 3, 3), '-d')
 
             pp.ion()
+            pp.draw()
             pp.show()
 
 
-def adjustTauc(mask, tauc):
-    """Where ice is floating or land is ice-free, tauc should be adjusted to have some preset default values."""
+def adjustTauc(cell_types, tauc):
+    """Where ice is floating or land is ice-free, tauc should be adjusted to have some preset default values.
+
+    :param cell_types: cell classification computed by :func:`PISM.vec.cellTypes`."""
 
     logMessage("  Adjusting initial estimate of 'tauc' to match PISM model for floating ice and ice-free bedrock.\n")
 
-    grid = mask.grid()
+    grid = tauc.grid()
     high_tauc = grid.ctx().config().get_double("basal_yield_stress.ice_free_bedrock")
 
-    with PISM.vec.Access(comm=tauc, nocomm=mask):
-        for (i, j) in grid.points():
-            if mask.ocean(i, j):
-                tauc[i, j] = 0
-            elif mask.ice_free(i, j):
-                tauc[i, j] = high_tauc
+    with PISM.vec.Access(comm=tauc):
+        tauc_array = tauc.local_array()
+        tauc_array[cell_types.ice_free_land] = high_tauc
+        tauc_array[cell_types.ocean] = 0
 
 
 def createDesignVec(grid, design_var, name=None, **kwargs):
@@ -304,7 +285,7 @@ def run():
 
     if (output_filename is not None) and (append_filename is not None):
         PISM.verbPrintf(1, com, "\nError: Only one of -a/-o is allowed.\n")
-        sys.edit(0)
+        sys.exit(0)
 
     if append_filename is not None:
         input_filename = append_filename
@@ -330,8 +311,6 @@ def run():
                                     "Python module used to do final setup of inverse solver")
     prep_module = prep_module.value() if prep_module.is_set() else None
 
-    is_regional = PISM.OptionBool("-regional", "Compute SIA/SSA using regional model semantics")
-
     using_zeta_fixed_mask = config.get_boolean("inverse.use_zeta_fixed_mask")
 
     inv_method = config.get_string("inverse.ssa.method")
@@ -350,6 +329,9 @@ def run():
     vecs = modeldata.vecs
     grid = modeldata.grid
 
+    # The inverse data file is probed for many variables below; open it only once.
+    inv_data_file = PISM.PIO(com, "netcdf3", inv_data_filename, PISM.PISM_READONLY)
+
     # Determine the prior guess for tauc/hardav. This can be one of
     # a) tauc/hardav from the input file (default)
     # b) tauc/hardav_prior from the inv_datafile if -inv_use_design_prior is set
@@ -357,7 +339,7 @@ def run():
     long_name = design_prior.metadata().get_string("long_name")
     units = design_prior.metadata().get_string("units")
     design_prior.set_attrs("", "best prior estimate for %s (used for inversion)" % long_name, units, "")
-    if PISM.util.fileHasVariable(inv_data_filename, "%s_prior" % design_var) and use_design_prior:
+    if inv_data_file.inq_var("%s_prior" % design_var) and use_design_prior:
         PISM.logging.logMessage("  Reading '%s_prior' from inverse data file %s.\n" % (design_var, inv_data_filename))
         design_prior.regrid(inv_data_filename, critical=True)
         vecs.add(design_prior, writing=saving_inv_data)
@@ -373,7 +355,7 @@ def run():
         vecs.add(design_prior, writing=True)
 
     if using_zeta_fixed_mask:
-        if PISM.util.fileHasVariable(inv_data_filename, "zeta_fixed_mask"):
+        if inv_data_file.inq_var("zeta_fixed_mask"):
             zeta_fixed_mask = PISM.model.createZetaFixedMaskVec(grid)
             zeta_fixed_mask.regrid(inv_data_filename)
             vecs.add(zeta_fixed_mask)
@@ -381,16 +363,14 @@ def run():
             if design_var == 'tauc':
                 logMessage(
                     "  Computing 'zeta_fixed_mask' (i.e. locations where design variable '%s' has a fixed value).\n" % design_var)
+                cell_types = forward_run.cellTypes()
                 zeta_fixed_mask = PISM.model.createZetaFixedMaskVec(grid)
-                zeta_fixed_mask.set(1)
-                mask = vecs.mask
-                with PISM.vec.Access(comm=zeta_fixed_mask, nocomm=mask):
-                    for (i, j) in grid.points():
-                        if mask.grounded_ice(i, j):
-                            zeta_fixed_mask[i, j] = 0
+                with PISM.vec.Access(comm=zeta_fixed_mask):
+                    # zeta is fixed everywhere except in grounded ice areas
+                    zeta_fixed_mask.local_array()[:] = np.logical_not(cell_types.grounded_ice)
                 vecs.add(zeta_fixed_mask)
 
-                adjustTauc(vecs.mask, design_prior)
+                adjustTauc(cell_types, design_prior)
             elif design_var == 'hardav':
                 PISM.logging.logPrattle(
                     "Skipping 'zeta_fixed_mask' for design variable 'hardav'; no natural locations to fix its value.")
@@ -419,7 +399,7 @@ def run():
         PISM.logging.logMessage("  Inversion starting from 'zeta_inv' found in %s\n" % output_filename)
         zeta.regrid(output_filename, True)
 
-    elif PISM.util.fileHasVariable(inv_data_filename, 'zeta_inv'):
+    elif inv_data_file.inq_var('zeta_inv'):
         PISM.logging.logMessage("  Inversion starting from 'zeta_inv' found in %s\n" % inv_data_filename)
         zeta.regrid(inv_data_filename, True)
     else:
@@ -427,11 +407,11 @@ def run():
 
     vel_ssa_observed = None
     vel_ssa_observed = PISM.model.create2dVelocityVec(grid, '_ssa_observed', stencil_width=2)
-    if PISM.util.fileHasVariable(inv_data_filename, "u_ssa_observed"):
+    if inv_data_file.inq_var("u_ssa_observed"):
         vel_ssa_observed.regrid(inv_data_filename, True)
         vecs.add(vel_ssa_observed, writing=saving_inv_data)
     else:
-        if not PISM.util.fileHasVariable(inv_data_filename, "u_surface_observed"):
+        if not inv_data_file.inq_var("u_surface_observed"):
             PISM.verbPrintf(
                 1, context.com, "Neither u/v_ssa_observed nor u/v_surface_observed is available in %s.\nAt least one must be specified.\n" % inv_data_filename)
             exit(1)
@@ -440,7 +420,7 @@ def run():
         vecs.add(vel_surface_observed, writing=saving_inv_data)
 
         sia_solver = PISM.SIAFD
-        if is_regional:
+        if forward_run.is_regional:
             sia_solver = PISM.SIAFD_Regional
         vel_sia_observed = PISM.sia.computeSIASurfaceVelocities(modeldata, sia_solver)
 
@@ -457,12 +437,14 @@ def run():
     # If the inverse data file has a variable tauc/hardav_true, this is probably
     # a synthetic inversion.  We'll load it now so that it will get written
     # out, if needed, at the end of the computation in the output file.
-    if PISM.util.fileHasVariable(inv_data_filename, "%s_true" % design_var):
+    if inv_data_file.inq_var("%s_true" % design_var):
         design_true = createDesignVec(grid, design_var, '%s_true' % design_var)
         design_true.regrid(inv_data_filename, True)
         design_true.read_attributes(inv_data_filename)
         vecs.add(design_true, writing=saving_inv_data)
 
+    inv_data_file.close()
+
     # Establish a logger which will save logging messages to the output file.
     message_logger = PISM.logging.CaptureLogger(output_filename, 'pismi_log')
     PISM.logging.add_logger(message_logger)
@@ -470,14 +452,16 @@ def run():
         message_logger.readOldLog()
 
     # Prep the output file from the grid so that we can save zeta to it during the runs.
-    if not append_mode:
+    if append_mode:
+        pio = PISM.PIO(com, config.get_string("output.format"), output_filename, PISM.PISM_READWRITE)
+    else:
         pio = PISM.util.prepare_output(output_filename)
-        pio.close()
-    zeta.write(output_filename)
+    zeta.write(pio)
 
     # Log the command line to the output file now so that we have a record of
     # what was attempted
-    PISM.util.writeProvenance(output_filename)
+    PISM.util.writeProvenance(pio)
+    pio.close()
 
     # Attach various iteration listeners to the solver as needed for:
 
@@ -496,17 +480,17 @@ def run():
 
     # Plotting
     if do_plotting:
-        solver.addIterationListener(InvSSAPlotListener(grid, Vmax))
+        solver.addIterationListener(InvSSAPlotListener(grid, Vmax.value()))
         if solver.method == 'ign':
-            solver.addLinearIterationListener(InvSSALinPlotListener(grid, Vmax))
+            solver.addLinearIterationListener(InvSSALinPlotListener(grid, Vmax.value()))
 
     # Solver is set up.  Give the user's prep module a chance to do any final
     # setup.
 
     if prep_module is not None:
         if prep_module.endswith(".py"):
-            prep_module = prep_module[0:-2]
-        exec("import %s as user_prep_module" % prep_module)
+            prep_module = prep_module[0:-3]
+        user_prep_module = importlib.import_module(prep_module)
         user_prep_module.prep_solver(solver)
 
     # Pausing (add this after the user's listeners)
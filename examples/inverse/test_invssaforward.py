@@ -59,18 +59,16 @@ def view(vec, viewer):
 #   v_global.get_vec().view(viewer)
 
 
-def adjustTauc(mask, tauc):
+def adjustTauc(cell_types, tauc):
     """Where ice is floating or land is ice-free, tauc should be adjusted to have some preset default values."""
 
-    grid = mask.grid()
+    grid = tauc.grid()
     high_tauc = grid.ctx().config().get_double("basal_yield_stress.ice_free_bedrock")
 
-    with PISM.vec.Access(comm=tauc, nocomm=mask):
-        for (i, j) in grid.points():
-            if mask.ocean(i, j):
-                tauc[i, j] = 0
-            elif mask.ice_free(i, j):
-                tauc[i, j] = high_tauc
+    with PISM.vec.Access(comm=tauc):
+        tauc_array = tauc.local_array()
+        tauc_array[cell_types.ice_free_land] = high_tauc
+        tauc_array[cell_types.ocean] = 0
 
 
 def createDesignVec(grid, design_var, name=None, **kwargs):
@@ -471,16 +469,13 @@ if __name__ == "__main__":
             if design_var == 'tauc':
                 logMessage(
                     "  Computing 'zeta_fixed_mask' (i.e. locations where design variable '%s' has a fixed value).\n" % design_var)
+                cell_types = ssarun.cellTypes()
                 zeta_fixed_mask = PISM.model.createZetaFixedMaskVec(grid)
-                zeta_fixed_mask.set(1)
-                mask = vecs.ice_mask
-                with PISM.vec.Access(comm=zeta_fixed_mask, nocomm=mask):
-                    for (i, j) in grid.points():
-                        if mask.grounded_ice(i, j):
-                            zeta_fixed_mask[i, j] = 0
+                with PISM.vec.Access(comm=zeta_fixed_mask):
+                    zeta_fixed_mask.local_array()[:] = np.logical_not(cell_types.grounded_ice)
                 vecs.add(zeta_fixed_mask)
 
-                adjustTauc(vecs.ice_mask, design_prior)
+                adjustTauc(cell_types, design_prior)
             elif design_var == 'hardav':
                 pass
             else:
@@ -37,6 +37,7 @@ class PlotListener(object):
     def __init__(self, grid):
         self.grid = grid
         self.figs = {}
+        self.images = {}
 
     def toproczero(self, *args):
         """Returns a ``numpy`` vector on processor zero corresponding to an :cpp:class:`IceModelVec`.
@@ -63,5 +64,24 @@ class PlotListener(object):
             self.figs[name] = fig
         return fig.number
 
+    def imshow(self, data, subplot, title):
+        """Plots a ``numpy`` array in the current figure using ``matplotlib.pyplot.imshow`` with a colorbar.
+        The image and the colorbar are created in the subplot `subplot` (a tuple of arguments of
+        ``matplotlib.pyplot.subplot``) on the first call with a given `title` and updated with new
+        data on subsequent calls."""
+        image = self.images.get(title)
+        if image is None:
+            import matplotlib.pyplot as pp
+            pp.subplot(*subplot)
+            image = pp.imshow(data, origin='lower', interpolation='nearest', cmap='jet')
+            colorbar = pp.colorbar(image)
+            pp.title(title)
+            self.images[title] = (image, colorbar)
+        else:
+            image, colorbar = image
+            image.set_data(data)
+            image.autoscale()
+            colorbar.update_normal(image)
+
     def __call__(self, solver, itr, data):
         raise NotImplementedError()
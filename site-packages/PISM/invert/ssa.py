@@ -42,6 +42,7 @@ class SSAForwardRun(PISM.ssa.SSARun):
         self.design_var = design_var
         self.design_var_param = createDesignVariableParam(self.config, self.design_var)
         self.is_regional = False
+        self.cell_types = None
 
     def designVariable(self):
         """:returns: String description of the design variable of the forward problem (e.g. 'tauc' or 'hardness')"""
@@ -51,6 +52,13 @@ class SSAForwardRun(PISM.ssa.SSARun):
         """:returns: Object that performs zeta->design variable transformation."""
         return self.design_var_param
 
+    def cellTypes(self):
+        """:returns: :class:`PISM.util.Bunch` of boolean ``numpy`` arrays classifying cells of the model ``mask``
+        (see :func:`PISM.vec.cellTypes`). Computed once and cached."""
+        if self.cell_types is None:
+            self.cell_types = PISM.vec.cellTypes(self.modeldata.vecs.mask)
+        return self.cell_types
+
     def _setFromOptions(self):
         """Initialize internal parameters based on command-line flags. Called from :meth:`PISM.ssa.SSARun.setup`."""
         self.is_regional = PISM.OptionBool("-regional", "regional mode")
@@ -119,6 +127,9 @@ class SSAForwardRunFromInputFile(SSAForwardRun):
         #
         # Hmmm.  A lot of code duplication with SSAFromInputFile._initSSACoefficients.
 
+        # Open the input file once and read all the fields from it.
+        input_file = PISM.PIO(self.grid.com, "guess_mode", self.input_filename, PISM.PISM_READONLY)
+
         vecs = self.modeldata.vecs
         thickness = vecs.land_ice_thickness
         bed = vecs.bedrock_altitude
@@ -131,34 +142,37 @@ class SSAForwardRunFromInputFile(SSAForwardRun):
 
         # Read in the PISM state variables that are used directly in the SSA solver
         for v in [thickness, bed, enthalpy]:
-            v.regrid(self.input_filename, True)
+            v.regrid(input_file, True)
 
         # variables mask and surface are computed from the geometry previously read
 
         gc = PISM.GeometryCalculator(self.config)
         gc.compute(sea_level, bed, thickness, mask, surface)
 
+        # classify cells once so that users of cellTypes() don't have to query the mask
+        self.cell_types = PISM.vec.cellTypes(mask)
+
         grid = self.grid
         config = self.modeldata.config
 
         # Compute yield stress from PISM state variables
         # (basal melt rate, tillphi, and basal water height) if they are available
 
-        file_has_inputs = (PISM.util.fileHasVariable(self.input_filename, 'bmelt') and
-                           PISM.util.fileHasVariable(self.input_filename, 'tillwat') and
-                           PISM.util.fileHasVariable(self.input_filename, 'tillphi'))
+        file_has_inputs = (input_file.inq_var('bmelt') and
+                           input_file.inq_var('tillwat') and
+                           input_file.inq_var('tillphi'))
 
         if file_has_inputs:
             bmr = PISM.model.createBasalMeltRateVec(grid)
             tillphi = PISM.model.createTillPhiVec(grid)
             tillwat = PISM.model.createBasalWaterVec(grid)
             for v in [bmr, tillphi, tillwat]:
-                v.regrid(self.input_filename, True)
+                v.regrid(input_file, True)
                 vecs.add(v)
 
             # The SIA model might need the age field.
             if self.config.get_boolean("age.enabled"):
-                vecs.age.regrid(self.input_filename, True)
+                vecs.age.regrid(input_file, True)
 
             hydrology_model = config.get_string("hydrology.model")
             if hydrology_model == "null":
@@ -178,47 +192,49 @@ class SSAForwardRunFromInputFile(SSAForwardRun):
             yieldstress.init()
 
             yieldstress.basal_material_yield_stress(vecs.tauc)
-        elif PISM.util.fileHasVariable(self.input_filename, 'tauc'):
-            vecs.tauc.regrid(self.input_filename, critical=True)
+        elif input_file.inq_var('tauc'):
+            vecs.tauc.regrid(input_file, critical=True)
 
-        if PISM.util.fileHasVariable(self.input_filename, 'ssa_driving_stress_x'):
+        if input_file.inq_var('ssa_driving_stress_x'):
             vecs.add(PISM.model.createDrivingStressXVec(self.grid))
-            vecs.ssa_driving_stress_x.regrid(self.input_filename, critical=True)
+            vecs.ssa_driving_stress_x.regrid(input_file, critical=True)
 
-        if PISM.util.fileHasVariable(self.input_filename, 'ssa_driving_stress_y'):
+        if input_file.inq_var('ssa_driving_stress_y'):
             vecs.add(PISM.model.createDrivingStressYVec(self.grid))
-            vecs.ssa_driving_stress_y.regrid(self.input_filename, critical=True)
+            vecs.ssa_driving_stress_y.regrid(input_file, critical=True)
 
         # read in the fractional floatation mask
         vecs.add(PISM.model.createGroundingLineMask(self.grid))
-        vecs.gl_mask.regrid(self.input_filename, critical=False, default_value=0.0)  # set to zero if not found
+        vecs.gl_mask.regrid(input_file, critical=False, default_value=0.0)  # set to zero if not found
 
         if self.is_regional:
             vecs.add(PISM.model.createNoModelMaskVec(self.grid), 'no_model_mask')
-            vecs.no_model_mask.regrid(self.input_filename, True)
+            vecs.no_model_mask.regrid(input_file, True)
             vecs.add(vecs.surface_altitude, 'usurfstore')
 
         if self.config.get_boolean('stress_balance.ssa.dirichlet_bc'):
             vecs.add(PISM.model.create2dVelocityVec(self.grid, name='_ssa_bc', desc='SSA velocity boundary condition', intent='intent'), "vel_ssa_bc")
-            has_u_ssa_bc = PISM.util.fileHasVariable(self.input_filename, 'u_ssa_bc')
-            has_v_ssa_bc = PISM.util.fileHasVariable(self.input_filename, 'v_ssa_bc')
+            has_u_ssa_bc = input_file.inq_var('u_ssa_bc')
+            has_v_ssa_bc = input_file.inq_var('v_ssa_bc')
             if (not has_u_ssa_bc) or (not has_v_ssa_bc):
                 PISM.verbPrintf(2, self.grid.com, "Input file '%s' missing Dirichlet boundary data u/v_ssa_bc; using zero default instead." % self.input_filename)
                 vecs.vel_ssa_bc.set(0.)
             else:
-                vecs.vel_ssa_bc.regrid(self.input_filename, True)
+                vecs.vel_ssa_bc.regrid(input_file, True)
 
             if self.is_regional:
                 vecs.add(vecs.no_model_mask, 'bc_mask')
             else:
                 vecs.add(PISM.model.createBCMaskVec(self.grid), 'bc_mask')
                 bc_mask_name = vecs.bc_mask.metadata().get_string("short_name")
-                if PISM.util.fileHasVariable(self.input_filename, bc_mask_name):
-                    vecs.bc_mask.regrid(self.input_filename, True)
+                if input_file.inq_var(bc_mask_name):
+                    vecs.bc_mask.regrid(input_file, True)
                 else:
                     PISM.verbPrintf(2, self.grid.com, "Input file '%s' missing Dirichlet location mask '%s'.  Default to no Dirichlet locations." % (self.input_filename, bc_mask_name))
                     vecs.bc_mask.set(0)
 
+        input_file.close()
+
         if PISM.util.fileHasVariable(self.inv_data_filename, 'vel_misfit_weight'):
             vecs.add(PISM.model.createVelocityMisfitWeightVec(self.grid))
             vecs.vel_misfit_weight.regrid(self.inv_data_filename, True)
@@ -566,7 +582,8 @@ class MisfitLogger(object):
 
         N = len(self.misfit_history)
 
-        ds = PISM.PIO(PISM.Context().com, "netcdf3", output_filename, PISM.PISM_READWRITE)
+        ctx = PISM.Context()
+        ds = PISM.PIO(ctx.com, ctx.config.get_string("output.format"), output_filename, PISM.PISM_READWRITE)
 
         ds.redef()
         ds.def_dim('inv_ssa_iter', N)
@@ -120,7 +120,8 @@ class ModelVecs(object):
         return self._vecs.is_available(name)
 
     def write(self, output_filename):
-        """Writes any member vectors that have been flagged as need writing to the given :file:`.nc` filename."""
+        """Writes any member vectors that have been flagged as need writing to the given :file:`.nc` filename
+        (or an open :cpp:class:`PIO`)."""
         vlist = [v for v in self.needs_writing]
         vlist.sort(key=lambda v: v.get_name())
         for v in vlist:
@@ -46,18 +46,24 @@ def prepare_output(filename, append_time=True):
 
 def writeProvenance(outfile, message=None):
     """Saves the time and command line arguments (or the provided `message`) to
-    the ``history`` attribute of the :file:`.nc` file `outfile`"""
+    the ``history`` attribute of the :file:`.nc` file `outfile`. The file can be
+    specified by its name or as an open :cpp:class:`PIO`."""
 
-    com = PISM.Context().com
+    ctx = PISM.Context()
+    com = ctx.com
 
-    ds = PISM.PIO(com, "netcdf3", outfile, PISM.PISM_READWRITE)
+    if isinstance(outfile, PISM.PIO):
+        ds = outfile
+    else:
+        ds = PISM.PIO(com, ctx.config.get_string("output.format"), outfile, PISM.PISM_READWRITE)
 
     if message is None:
         message = PISM.timestamp(com) + ": " + PISM.args_string()
     ds.append_history(message)
     ds.put_att_text("PISM_GLOBAL", "source", "PISM " + PISM.PISM_Revision)
 
-    ds.close()
+    if ds is not outfile:
+        ds.close()
 
 
 def fileHasVariable(filename, varname):
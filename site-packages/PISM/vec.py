@@ -157,3 +157,37 @@ def randVectorV(grid, scale, stencil_width=None):
         rv.update_ghosts()
 
     return rv
+
+
+def cellTypes(mask):
+    """Classify the cells of a cell type mask, for example the ``mask`` field of a model.
+
+      :param mask: An :cpp:class:`IceModelVec2CellType` (or :cpp:class:`IceModelVec2Int`)
+                   containing cell type values.
+
+    Returns a :class:`PISM.util.Bunch` of boolean ``numpy`` arrays covering the part of
+    the grid owned by this processor, with entries ``ocean``, ``grounded``, ``icy``,
+    ``grounded_ice``, ``floating_ice``, ``ice_free``, ``ice_free_ocean``, and
+    ``ice_free_land`` defined the same way as the :cpp:class:`IceModelVec2CellType`
+    methods of the same names. Entry ``[j - grid.ys(), i - grid.xs()]`` corresponds
+    to the cell ``(i, j)``.
+    """
+    import numpy as np
+
+    with Access(nocomm=mask):
+        # round the same way IceModelVec2Int::as_int() does
+        M = np.floor(mask.local_array() + 0.5)
+
+    ocean = M >= PISM.MASK_FLOATING
+    grounded = np.logical_not(ocean)
+    icy = np.logical_or(M == PISM.MASK_GROUNDED, M == PISM.MASK_FLOATING)
+    ice_free = np.logical_not(icy)
+
+    return PISM.util.Bunch(ocean=ocean,
+                           grounded=grounded,
+                           icy=icy,
+                           grounded_ice=np.logical_and(icy, grounded),
+                           floating_ice=np.logical_and(icy, ocean),
+                           ice_free=ice_free,
+                           ice_free_ocean=np.logical_and(ocean, ice_free),
+                           ice_free_land=np.logical_and(grounded, ice_free))
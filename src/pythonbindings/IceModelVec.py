@@ -19,3 +19,20 @@ def numpy(self):
         return numpy.array(tmp.get()).reshape(self.shape())
     else:
         return None
+
+
+def local_array(self):
+    """Return a NumPy view of the part of this field owned by this processor.
+
+    The view excludes ghosts and shares storage with the field, so it
+    has to be used between begin_access() and end_access() (see
+    PISM.vec.Access) if ghosts need to be updated afterwards."""
+    grid = self.grid()
+    xm, ym = grid.xm(), grid.ym()
+    w = self.stencil_width()
+
+    array = self.vec().getArray().reshape(ym + 2 * w, xm + 2 * w, -1)
+    if array.shape[-1] == 1:
+        array = array[:, :, 0]
+
+    return array[w:w + ym, w:w + xm]
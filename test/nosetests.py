@@ -132,6 +132,52 @@ def vec_access_test():
         pass
 
 
+def vec_local_array_test():
+    "Test IceModelVec.local_array()"
+    grid = create_dummy_grid()
+
+    vec_scalar_ghosted = PISM.vec.randVectorS(grid, 1.0, 2)
+    vec_vector = PISM.vec.randVectorV(grid, 2.0)
+
+    with PISM.vec.Access(comm=vec_scalar_ghosted, nocomm=vec_vector):
+        v = vec_scalar_ghosted.local_array()
+        assert v.shape == (grid.ym(), grid.xm())
+        for (i, j) in grid.points():
+            assert v[j - grid.ys(), i - grid.xs()] == vec_scalar_ghosted[i, j]
+
+        u = vec_vector.local_array()
+        assert u.shape == (grid.ym(), grid.xm(), 2)
+        for (i, j) in grid.points():
+            assert u[j - grid.ys(), i - grid.xs(), 0] == vec_vector[i, j].u
+            assert u[j - grid.ys(), i - grid.xs(), 1] == vec_vector[i, j].v
+
+        v[:] = 1.0
+
+    with PISM.vec.Access(nocomm=vec_scalar_ghosted):
+        for (i, j) in grid.points_with_ghosts():
+            assert vec_scalar_ghosted[i, j] == 1.0
+
+
+def vec_cell_types_test():
+    "Test PISM.vec.cellTypes()"
+    grid = create_dummy_grid()
+
+    mask = PISM.model.createIceMaskVec(grid)
+    mask_values = [PISM.MASK_ICE_FREE_BEDROCK, PISM.MASK_GROUNDED,
+                   PISM.MASK_FLOATING, PISM.MASK_ICE_FREE_OCEAN]
+    with PISM.vec.Access(nocomm=mask):
+        for (i, j) in grid.points():
+            mask[i, j] = mask_values[(i + j) % len(mask_values)]
+
+    cell_types = PISM.vec.cellTypes(mask)
+
+    with PISM.vec.Access(nocomm=mask):
+        for (i, j) in grid.points():
+            for name in ["ocean", "grounded", "icy", "grounded_ice", "floating_ice",
+                         "ice_free", "ice_free_ocean", "ice_free_land"]:
+                assert cell_types[name][j - grid.ys(), i - grid.xs()] == getattr(mask, name)(i, j)
+
+
 def create_modeldata_test():
     "Test creating the ModelData class"
     grid = create_dummy_grid()
@@ -365,6 +411,10 @@ def util_test():
     PISM.util.writeProvenance(output_file)
     PISM.util.writeProvenance(output_file, message="history string")
 
+    pio = PISM.PIO(grid.com, "netcdf3", output_file, PISM.PISM_READWRITE)
+    PISM.util.writeProvenance(pio, message="history string")
+    pio.close()
+
     PISM.util.fileHasVariable(output_file, "data")
 
     # Test PISM.util.Bunch